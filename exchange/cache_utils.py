@@ -1,7 +1,25 @@
 from django.core.cache import cache
 from django.conf import settings
+from django.http import HttpResponse
+from contextlib import contextmanager
+from functools import wraps
 import hashlib
-import json
+import logging
+import orjson
+import random
+import requests
+import time
+from .responses import OrjsonResponse, conditional_success_response
+
+logger = logging.getLogger(__name__)
+
+# How long a scheduled refresh may hold the per-key refresh slot
+SWR_REFRESH_LOCK_TIMEOUT = 60
+
+# A fill may call Frankfurter (15s timeout), so let the lock outlive one upstream request
+FILL_LOCK_TIMEOUT = 30
+# How long concurrent misses wait for the filling worker before filling themselves
+FILL_LOCK_BLOCKING_TIMEOUT = 5
 
 
 class CacheManager:
@@ -9,23 +27,165 @@ class CacheManager:
 
     @staticmethod
     def generate_cache_key(prefix, params):
-        """Generate a stable cache key based on a prefix and params dict."""
-        param_str = json.dumps(params, sort_keys=True)
-        param_hash = hashlib.md5(param_str.encode()).hexdigest()
+        """Generate a stable cache key based on a prefix and params dict.
+        
+        Params are serialized with sorted keys by orjson and hashed with blake2b keyed
+        by the prefix, both in C.
+        """
+        param_hash = hashlib.blake2b(
+            orjson.dumps(params, option=orjson.OPT_SORT_KEYS), digest_size=16, key=prefix.encode()
+        ).hexdigest()
         return f"{prefix}:{param_hash}"
 
     @staticmethod
     def get_cached_data(cache_key, cache_timeout):
         """Fetch data from cache by key."""
-        return cache.get(cache_key)
+        payload = CacheManager.get_cached_bytes(cache_key)
+        return orjson.loads(payload) if payload is not None else None
 
     @staticmethod
     def set_cached_data(cache_key, data, cache_timeout):
-        """Store data into cache with timeout."""
-        cache.set(cache_key, data, cache_timeout)
+        """Store data into cache with timeout, encoded as compact JSON bytes."""
+        CacheManager.set_cached_bytes(cache_key, orjson.dumps(data), cache_timeout)
+
+    @staticmethod
+    def get_cached_bytes(cache_key):
+        """Fetch an already JSON-encoded payload from cache without decoding it."""
+        return cache.get(cache_key)
+
+    @staticmethod
+    def set_cached_bytes(cache_key, payload, cache_timeout):
+        """Store an already JSON-encoded payload into cache with timeout."""
+        cache.set(cache_key, payload, CacheManager.get_jittered_timeout(cache_timeout))
+
+    @staticmethod
+    def get_with_swr(cache_key, cache_timeout, refresh_fn):
+        """Fetch a JSON payload stored by set_with_swr, serving stale data while it is refreshed.
+        
+        Once an entry is past its fresh period, the stale value is still returned and
+        refresh_fn is called to schedule a background refresh (e.g. enqueue a Celery
+        task), so it must not block. Only one caller per key schedules a refresh.
+        Returns the encoded bytes as stored, or None on a miss.
+        """
+        entry = cache.get(cache_key)
+        if entry is None:
+            return None
+        
+        payload, fresh_until = entry
+        if time.time() > fresh_until and cache.add(f"{cache_key}:refresh", True, SWR_REFRESH_LOCK_TIMEOUT):
+            try:
+                refresh_fn()
+            except Exception as e:
+                logger.error(f"Failed to schedule refresh of stale cache entry: {str(e)}")
+        return payload
+
+    @staticmethod
+    def set_with_swr(cache_key, payload, cache_timeout):
+        """Store a JSON payload that stays fresh for cache_timeout and can be served stale for as long again."""
+        timeout = CacheManager.get_jittered_timeout(cache_timeout)
+        cache.set(cache_key, (payload, time.time() + timeout), timeout * 2)
+        cache.delete(f"{cache_key}:refresh")
+
+    @staticmethod
+    @contextmanager
+    def fill_lock(cache_key):
+        """Hold a per-key lock while a cache entry is filled, so concurrent misses fill it once.
+        
+        Waits up to FILL_LOCK_BLOCKING_TIMEOUT for another holder. If the lock can't be
+        taken (timed out, Redis unavailable, or a backend without locks) the caller
+        goes ahead unlocked rather than failing the request.
+        """
+        lock = None
+        try:
+            lock_factory = getattr(cache, 'lock', None)
+            if lock_factory:
+                lock = lock_factory(f"{cache_key}:fill", timeout=FILL_LOCK_TIMEOUT, blocking_timeout=FILL_LOCK_BLOCKING_TIMEOUT)
+            if lock is not None and not lock.acquire():
+                lock = None
+        except Exception as e:
+            logger.error(f"Failed to acquire cache fill lock: {str(e)}")
+            lock = None
+        
+        try:
+            yield
+        finally:
+            if lock is not None:
+                try:
+                    lock.release()
+                except Exception as e:
+                    # Usually the lock expired during a slow fill
+                    logger.error(f"Failed to release cache fill lock: {str(e)}")
+
+    @staticmethod
+    def get_jittered_timeout(cache_timeout):
+        """Spread timeouts by +/-10% so keys written together don't expire together."""
+        return int(cache_timeout * random.uniform(0.9, 1.1))
 
     @staticmethod
     def get_cache_timeout(cache_type):
         """Lookup timeout seconds from settings for a given cache type."""
         return settings.CACHE_TIMEOUT.get(cache_type, 300)
 
+
+def cached_view(key_fn, timeout_key, refresh_fn=None):
+    """Serve a view's JSON data from cache, filling misses once per key under fill_lock.
+    
+    key_fn(request) returns the cache key. The wrapped method returns (data, source),
+    which is encoded once for both the cache entry and the response; an HttpResponse
+    it returns (e.g. a 400) is passed through uncached. When refresh_fn(request) is
+    given, entries are stored with set_with_swr and stale hits call it to schedule a
+    refresh. Successful responses carry an ETag, so repeat polls can get a 304.
+    Upstream and server errors become JSON error responses.
+    """
+    # Settings don't change at runtime, so look the timeout up once per view
+    cache_timeout = CacheManager.get_cache_timeout(timeout_key)
+    
+    def decorator(view_fn):
+        @wraps(view_fn)
+        def wrapper(self, request, *args, **kwargs):
+            try:
+                cache_key = key_fn(request)
+                
+                def read_cache():
+                    if refresh_fn is None:
+                        return CacheManager.get_cached_bytes(cache_key)
+                    return CacheManager.get_with_swr(cache_key, cache_timeout, lambda: refresh_fn(request))
+                
+                # 1. Try cache first
+                cached = read_cache()
+                if cached:
+                    return conditional_success_response(request, cached, 'cache')
+                
+                with CacheManager.fill_lock(cache_key):
+                    # 2. Another worker may have filled it while we waited for the lock
+                    cached = read_cache()
+                    if cached:
+                        return conditional_success_response(request, cached, 'cache')
+                    
+                    # 3. Cache miss, load through the view
+                    result = view_fn(self, request, *args, **kwargs)
+                    if isinstance(result, HttpResponse):
+                        return result
+                    data, source = result
+                    
+                    # 4. Store to cache
+                    data_json = orjson.dumps(data)
+                    if refresh_fn is None:
+                        CacheManager.set_cached_bytes(cache_key, data_json, cache_timeout)
+                    else:
+                        CacheManager.set_with_swr(cache_key, data_json, cache_timeout)
+                
+                return conditional_success_response(request, data_json, source)
+            
+            except requests.exceptions.RequestException as e:
+                return OrjsonResponse({
+                    'success': False,
+                    'error': f'API request failed: {str(e)}'
+                }, status=500)
+            except Exception as e:
+                return OrjsonResponse({
+                    'success': False,
+                    'error': f'Server error: {str(e)}'
+                }, status=500)
+        return wrapper
+    return decorator
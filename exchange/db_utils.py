@@ -1,6 +1,8 @@
+from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Min, Max
+from datetime import date, timedelta
+from django.db.models import FloatField
+from django.db.models.functions import Cast
 from .models import ExchangeRate, Currency
 import logging
 
@@ -11,105 +13,147 @@ class DatabaseManager:
     """Database manager utility class."""
     
     @staticmethod
-    def save_exchange_rate(base_currency, target_currency, rate, date, source='frankfurter'):
-        """Save exchange rate data to database."""
+    def bulk_save_exchange_rates(base_currency, rates_by_date, source='frankfurter', skip_existing=False, raise_errors=False):
+        """Upsert a {date: {target_currency: rate}} mapping in one transaction.
+        
+        Rows are written in INSERT ... ON CONFLICT batches of 1000. With skip_existing,
+        rows already stored are dropped first using one SELECT over the batch's
+        targets and date span, instead of being rewritten with the same historical rate.
+        Returns the number of rows written, or None on failure. With raise_errors the
+        failure is re-raised instead, so an enclosing transaction rolls back too.
+        """
         try:
-            # Check if record already exists
-            existing_rate = ExchangeRate.objects.filter(
-                base_currency=base_currency,
-                target_currency=target_currency,
-                date=date
-            ).first()
+            if skip_existing and rates_by_date:
+                rates_by_date = DatabaseManager._drop_existing_rates(base_currency, rates_by_date)
             
-            if existing_rate:
-                # Update existing record
-                existing_rate.rate = rate
-                existing_rate.timestamp = timezone.now()
-                existing_rate.source = source
-                existing_rate.save()
-                return existing_rate
-            else:
-                # Create new record
-                exchange_rate = ExchangeRate(
+            now = timezone.now()
+            exchange_rates = [
+                ExchangeRate(
                     base_currency=base_currency,
                     target_currency=target_currency,
                     rate=rate,
-                    date=date,
+                    date=date_str,
+                    timestamp=now,
                     source=source
                 )
-                exchange_rate.save()
-                return exchange_rate
-                
+                for date_str, rates_on_date in rates_by_date.items()
+                for target_currency, rate in rates_on_date.items()
+            ]
+            if not exchange_rates:
+                return 0
+            with transaction.atomic():
+                ExchangeRate.objects.bulk_create(
+                    exchange_rates,
+                    batch_size=1000,
+                    update_conflicts=True,
+                    update_fields=['rate', 'timestamp', 'source'],
+                    unique_fields=['base_currency', 'target_currency', 'date']
+                )
+            return len(exchange_rates)
         except Exception as e:
-            logger.error(f"Failed to save exchange rate: {str(e)}")
+            logger.error(f"Failed to bulk save exchange rates: {str(e)}")
+            if raise_errors:
+                raise
             return None
     
+    @staticmethod
+    def _drop_existing_rates(base_currency, rates_by_date):
+        """Return rates_by_date without the (date, target_currency) rows already in the database."""
+        rate_dates = {date.fromisoformat(date_str): date_str for date_str in rates_by_date}
+        target_currencies = {target for rates_on_date in rates_by_date.values() for target in rates_on_date}
+        existing = set(ExchangeRate.objects.filter(
+            base_currency=base_currency,
+            target_currency__in=target_currencies,
+            date__range=(min(rate_dates), max(rate_dates))
+        ).values_list('date', 'target_currency'))
+        
+        new_rates = {}
+        for rate_date, date_str in rate_dates.items():
+            rates_on_date = {
+                target_currency: rate
+                for target_currency, rate in rates_by_date[date_str].items()
+                if (rate_date, target_currency) not in existing
+            }
+            if rates_on_date:
+                new_rates[date_str] = rates_on_date
+        return new_rates
+    
     @staticmethod
     def save_currencies(currencies_data):
         """Save currency data."""
         try:
-            for code, name in currencies_data.items():
-                currency, created = Currency.objects.update_or_create(
-                    code=code,
-                    defaults={'name': name}
-                )
+            currencies = [Currency(code=code, name=name) for code, name in currencies_data.items()]
+            Currency.objects.bulk_create(
+                currencies,
+                update_conflicts=True,
+                update_fields=['name'],
+                unique_fields=['code']
+            )
             return True
         except Exception as e:
             logger.error(f"Failed to save currencies: {str(e)}")
             return False
     
     @staticmethod
-    def database_covers_range(base_currency, target_currencies, request_start, request_end):
-        """Return True if DB fully covers [request_start, request_end] for all targets.
+    def get_currency_codes():
+        """Return the set of currency codes stored in the currencies table, empty on failure."""
+        try:
+            return frozenset(Currency.objects.values_list('code', flat=True))
+        except Exception as e:
+            logger.error(f"Failed to get currency codes from database: {str(e)}")
+            return frozenset()
+    
+    @staticmethod
+    def _compute_missing_ranges(sorted_dates, request_start, request_end, no_data_days=frozenset()):
+        """Find the gaps between consecutive present dates within [request_start, request_end].
         
-        If target_currencies is empty, check coverage for the base across any targets.
+        Only the present dates are visited, not every calendar day of the request.
+        Gaps made up solely of weekend days and no_data_days (days Frankfurter has
+        already answered with no rates, such as ECB holidays) are skipped, since
+        fetching them again can't fill them.
         """
-        if target_currencies:
-            for target_currency in target_currencies:
-                target_query = ExchangeRate.objects.filter(
-                    base_currency=base_currency,
-                    target_currency=target_currency
-                )
-                target_date_range = target_query.aggregate(
-                    min_date=Min('date'),
-                    max_date=Max('date')
-                )
-                
-                min_date = target_date_range['min_date']
-                max_date = target_date_range['max_date']
-                if not (min_date and max_date):
-                    logger.debug(f"Target {target_currency} has no data in database")
-                    return False
-                
-                if not (min_date <= request_start and max_date >= request_end):
-                    logger.debug(
-                        f"Target {target_currency} range [{min_date}, {max_date}] doesn't cover request [{request_start}, {request_end}]"
-                    )
-                    return False
-            return True
-        
-        # No target currencies specified, check for base currency with any target
-        base_query = ExchangeRate.objects.filter(base_currency=base_currency)
-        db_date_range = base_query.aggregate(min_date=Min('date'), max_date=Max('date'))
-        min_date = db_date_range['min_date']
-        max_date = db_date_range['max_date']
-        return bool(min_date and max_date and (min_date <= request_start) and (max_date >= request_end))
+        one_day = timedelta(days=1)
+        missing_ranges = []
+        previous = request_start - one_day
+        for current in sorted_dates + [request_end + one_day]:
+            if current - previous > one_day:
+                gap_start = previous + one_day
+                gap_end = current - one_day
+                if not DatabaseManager._is_known_empty(gap_start, gap_end, no_data_days):
+                    missing_ranges.append((gap_start, gap_end))
+            previous = current
+        return missing_ranges
     
     @staticmethod
-    def get_time_series_data(base_currency, target_currencies, start_date, end_date):
+    def _is_known_empty(range_start, range_end, no_data_days):
+        """Return True if every day in [range_start, range_end] is a weekend day or in no_data_days."""
+        one_day = timedelta(days=1)
+        day = range_start
+        # Stops at the first weekday that may have data, so long gaps stay cheap
+        while day <= range_end:
+            if day.weekday() < 5 and day not in no_data_days:
+                return False
+            day += one_day
+        return True
+    
+    @staticmethod
+    def get_time_series_data(base_currency, target_currencies, start_date, end_date, no_data_days=None):
         """Get time series data from database for the specified date range.
         
-        Returns formatted data dict if found, None otherwise.
+        start_date and end_date are date objects, end_date None meaning up to today.
+        Returns (db_data, missing_ranges) where missing_ranges maps each target
+        currency (None when no targets were requested) to the [(start, end), ...]
+        sub-ranges the database doesn't have. Both are None on failure.
+        
+        no_data_days maps a target currency (None for any target) to the set of days
+        known to have no rates for it; gaps made only of those days aren't missing.
+        
+        Coverage and gaps are derived from the same single query that builds the
+        response, rather than re-querying the table per target.
         """
         try:
-            # Check if database covers the range
-            from datetime import datetime
-            request_start = datetime.strptime(start_date, '%Y-%m-%d').date()
-            request_end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else datetime.now().date()
-            
-            if not DatabaseManager.database_covers_range(base_currency, target_currencies, request_start, request_end):
-                logger.debug(f"Database doesn't fully cover request range [{request_start}, {request_end}] for all target currencies")
-                return None
+            request_start = start_date
+            request_end = end_date or date.today()
             
             # Query the specific data
             query = ExchangeRate.objects.filter(
@@ -123,29 +167,57 @@ class DatabaseManager:
             if target_currencies:
                 query = query.filter(target_currency__in=target_currencies)
             
-            # Get data grouped by date
-            rates = query.order_by('date')
-            
-            if not rates.exists():
-                return None
+            # Get data grouped by date, with rates cast to double precision so the
+            # driver returns floats rather than building a Decimal per row
+            rates = query.annotate(
+                rate_float=Cast('rate', FloatField())
+            ).order_by('date', 'target_currency').values_list(
+                'date', 'target_currency', 'rate_float'
+            ).iterator(chunk_size=2000)
             
             # Format data
             db_data = {
                 'base': base_currency,
-                'start_date': start_date,
-                'end_date': end_date if end_date else datetime.now().date().isoformat(),
+                'start_date': request_start.isoformat(),
+                'end_date': request_end.isoformat(),
                 'rates': {}
             }
             
-            for rate in rates:
-                date_str = rate.date.isoformat()
-                if date_str not in db_data['rates']:
-                    db_data['rates'][date_str] = {}
-                db_data['rates'][date_str][rate.target_currency] = float(rate.rate)
+            # Present dates per target (or across all targets), in ascending order
+            present_dates = {target_currency: [] for target_currency in target_currencies}
+            if not target_currencies:
+                present_dates[None] = []
+            
+            rates_by_date = db_data['rates']
+            # The driver returns a new str per row; share one object per currency code
+            currency_codes = {}
+            current_date = None
+            for rate_date, target_currency, rate in rates:
+                # Rows are ordered by date, so each date's key and dict are built once
+                if rate_date != current_date:
+                    current_date = rate_date
+                    rates_on_date = rates_by_date[rate_date.isoformat()] = {}
+                    if not target_currencies:
+                        present_dates[None].append(rate_date)
+                target_currency = currency_codes.setdefault(target_currency, target_currency)
+                rates_on_date[target_currency] = rate
+                if target_currencies:
+                    present_dates[target_currency].append(rate_date)
+            
+            no_data_days = no_data_days or {}
+            missing_ranges = {}
+            for target_currency, dates in present_dates.items():
+                # A day without rates for any target has none for this one either
+                known_empty = no_data_days.get(target_currency, frozenset()) | no_data_days.get(None, frozenset())
+                ranges = DatabaseManager._compute_missing_ranges(dates, request_start, request_end, known_empty)
+                if ranges:
+                    missing_ranges[target_currency] = ranges
             
-            return db_data
+            if missing_ranges:
+                logger.debug(f"Database doesn't fully cover request range [{request_start}, {request_end}]: {missing_ranges}")
+            
+            return db_data, missing_ranges
             
         except Exception as e:
             logger.error(f"Failed to get time series data from database: {str(e)}")
-            return None
-
+            return None, None
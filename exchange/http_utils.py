@@ -0,0 +1,66 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .cache_utils import CacheManager
+
+
+def build_session():
+    """Build a requests session that keeps pooled connections to the upstream API alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=50,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    )
+    session.mount('https://', adapter)
+    session.headers.update({
+        'Accept-Encoding': 'gzip',
+        'User-Agent': 'fx-dashboard/1.0',
+    })
+    return session
+
+
+# Shared per process so TCP/TLS handshakes to Frankfurter are reused across requests
+http_session = build_session()
+
+
+def fetch_json(url, params=None, timeout=15, revalidate=True):
+    """GET a JSON body from upstream, revalidating any previously seen copy.
+    
+    Bodies that came with an ETag or Last-Modified header are kept in cache with
+    those validators. Later requests send If-None-Match / If-Modified-Since, and a
+    304 answer reuses the cached body instead of downloading it again. Pass
+    revalidate=False for one-off requests whose body isn't worth keeping.
+    """
+    if not revalidate:
+        response = http_session.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    
+    cache_key = CacheManager.generate_cache_key('upstream', {'url': url, **(params or {})})
+    cache_timeout = CacheManager.get_cache_timeout('upstream')
+    cached = CacheManager.get_cached_data(cache_key, cache_timeout)
+    
+    headers = {}
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+    
+    response = http_session.get(url, params=params, headers=headers, timeout=timeout)
+    if cached and response.status_code == 304:
+        CacheManager.set_cached_data(cache_key, cached, cache_timeout)
+        return cached['body']
+    response.raise_for_status()
+    
+    body = response.json()
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag or last_modified:
+        CacheManager.set_cached_data(cache_key, {
+            'body': body,
+            'etag': etag,
+            'last_modified': last_modified,
+        }, cache_timeout)
+    return body
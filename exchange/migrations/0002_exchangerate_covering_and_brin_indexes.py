@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-14 15:28
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='exchangerate',
+            name='exchange_ra_base_cu_8d841e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='exchangerate',
+            name='exchange_ra_timesta_efcd56_idx',
+        ),
+        migrations.AddIndex(
+            model_name='exchangerate',
+            index=models.Index(fields=['base_currency', 'target_currency', 'date'], include=('rate',), name='er_covering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangerate',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['date'], name='er_date_brin'),
+        ),
+    ]
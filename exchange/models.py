@@ -1,3 +1,4 @@
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
 from django.utils import timezone
 
@@ -29,9 +30,15 @@ class ExchangeRate(models.Model):
     class Meta:
         db_table = 'exchange_rates'
         indexes = [
-            models.Index(fields=['base_currency', 'target_currency', 'date']),
+            # Covers time series reads so they are served from the index alone
+            models.Index(
+                fields=['base_currency', 'target_currency', 'date'],
+                include=['rate'],
+                name='er_covering_idx'
+            ),
             models.Index(fields=['base_currency', 'date']),
-            models.Index(fields=['timestamp']),
+            # Rows arrive roughly in date order, so a BRIN index is tiny and suits range scans
+            BrinIndex(fields=['date'], name='er_date_brin'),
         ]
         ordering = ['-date', '-timestamp']
         unique_together = ['base_currency', 'target_currency', 'date']
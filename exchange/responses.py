@@ -0,0 +1,52 @@
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+import hashlib
+import orjson
+
+# Let browsers reuse a response briefly, then revalidate it with If-None-Match
+CLIENT_CACHE_CONTROL = 'private, max-age=60'
+
+
+class OrjsonResponse(HttpResponse):
+    """JSON response encoded with orjson, a faster drop-in for JsonResponse on dict payloads."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS), **kwargs)
+
+
+class EncodedSuccessResponse(HttpResponse):
+    """Success response built around an already JSON-encoded data payload.
+    
+    The payload bytes are spliced into the envelope as-is, so cached bodies
+    are served without being decoded and encoded again.
+    """
+
+    def __init__(self, data_json, source, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        content = b'{"success":true,"data":' + data_json + b',"source":' + orjson.dumps(source) + b'}'
+        super().__init__(content=content, **kwargs)
+
+
+def conditional_success_response(request, data_json, source):
+    """Build an EncodedSuccessResponse, or a 304 when the client already holds this data.
+    
+    The ETag is weak because it identifies the data payload, not the whole envelope,
+    whose source field changes between cache, database and API responses.
+    """
+    opaque_tag = f'"{hashlib.blake2b(data_json, digest_size=16).hexdigest()}"'
+    etag = f'W/{opaque_tag}'
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        # Weak comparison, as required for If-None-Match
+        client_etags = {client_etag.removeprefix('W/') for client_etag in parse_etags(if_none_match)}
+        if '*' in client_etags or opaque_tag in client_etags:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            response['Cache-Control'] = CLIENT_CACHE_CONTROL
+            return response
+    
+    response = EncodedSuccessResponse(data_json, source)
+    response['ETag'] = etag
+    response['Cache-Control'] = CLIENT_CACHE_CONTROL
+    return response
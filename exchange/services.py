@@ -0,0 +1,313 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import lru_cache
+import logging
+import threading
+import time
+import orjson
+import requests
+from .cache_utils import CacheManager
+from .db_utils import DatabaseManager
+from .http_utils import fetch_json
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent Frankfurter requests issued by one worker process
+MAX_FETCH_WORKERS = 8
+
+# Seconds a worker keeps its copy of the supported currency codes, and how soon
+# it looks again while the currencies table is still empty
+SUPPORTED_CODES_TIMEOUT = 3600
+SUPPORTED_CODES_EMPTY_TIMEOUT = 60
+
+# Past days never gain rates, so what Frankfurter answered empty is kept for 30 days
+NO_DATA_DAYS_TIMEOUT = 30 * 24 * 3600
+
+_supported_codes = (0, frozenset())
+
+_fetch_executor = None
+_fetch_executor_lock = threading.Lock()
+
+
+def get_fetch_executor():
+    """Return the process-wide thread pool used for concurrent Frankfurter fetches.
+    
+    Created lazily so workers that never fetch partial ranges don't start threads,
+    and kept for the life of the process so requests don't pay thread start-up.
+    """
+    global _fetch_executor
+    if _fetch_executor is None:
+        with _fetch_executor_lock:
+            if _fetch_executor is None:
+                _fetch_executor = ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS, thread_name_prefix='frankfurter')
+    return _fetch_executor
+
+
+@lru_cache(maxsize=1024)
+def parse_symbols(symbols):
+    """Normalize a raw comma-separated symbols param into a tuple of upper-case codes."""
+    return tuple(code for code in (s.strip().upper() for s in symbols.split(',')) if code)
+
+
+def get_supported_currency_codes():
+    """Return the currency codes in the database, memoized per process.
+    
+    Empty until the currencies table has been filled (by the Celery fetch or
+    CurrenciesView), or while the database can't be read, in which case callers
+    should skip validation. An empty result is re-checked after
+    SUPPORTED_CODES_EMPTY_TIMEOUT, so an outage costs one query per minute.
+    """
+    global _supported_codes
+    expires_at, codes = _supported_codes
+    if time.monotonic() >= expires_at:
+        codes = DatabaseManager.get_currency_codes()
+        timeout = SUPPORTED_CODES_TIMEOUT if codes else SUPPORTED_CODES_EMPTY_TIMEOUT
+        _supported_codes = (time.monotonic() + timeout, codes)
+    return codes
+
+
+@lru_cache(maxsize=4096)
+def build_frankfurter_request(base_currency, symbols, start_date, end_date):
+    """Return the (url, params) of a Frankfurter time series request, end_date None meaning the latest date.
+    
+    Memoized since dashboards repeat the same few requests. params is a tuple of
+    pairs so the shared cached value can't be mutated by a caller.
+    """
+    date_range = f"{start_date.isoformat()}..{end_date.isoformat()}" if end_date else f"{start_date.isoformat()}.."
+    
+    # build API URL
+    url = f"https://api.frankfurter.dev/v1/{date_range}"
+    params = ()
+    
+    if base_currency:
+        params += (('base', base_currency),)
+    if symbols:
+        params += (('symbols', symbols),)
+    return url, params
+
+
+class TimeSeriesService:
+    """Load, fetch and cache time series data, shared by the view and Celery tasks."""
+
+    @staticmethod
+    def parse_dates(start_date, end_date):
+        """Parse YYYY-MM-DD query params into (start_date, end_date), end_date None when empty.
+        
+        Raises ValueError on a malformed date.
+        """
+        return date.fromisoformat(start_date), date.fromisoformat(end_date) if end_date else None
+
+    @staticmethod
+    def get_cache_key(base_currency, symbols, start_date, end_date):
+        """Cache key of a time series request, as built from its raw query params."""
+        return CacheManager.generate_cache_key('time_series', {
+            'start_date': start_date,
+            'end_date': end_date,
+            'base': base_currency,
+            'symbols': symbols,
+        })
+
+    @staticmethod
+    def refresh_cache(base_currency, symbols, start_date, end_date):
+        """Reload a time series entry, given its raw query params, and store it into cache."""
+        data, _ = TimeSeriesService.load(base_currency, symbols, *TimeSeriesService.parse_dates(start_date, end_date))
+        CacheManager.set_with_swr(
+            TimeSeriesService.get_cache_key(base_currency, symbols, start_date, end_date),
+            orjson.dumps(data),
+            CacheManager.get_cache_timeout('time_series')
+        )
+        return data
+
+    @staticmethod
+    def get_unsupported_symbols(symbols):
+        """Return the codes in a raw symbols param that aren't supported currencies."""
+        supported = get_supported_currency_codes()
+        if not supported:
+            return []
+        return [code for code in parse_symbols(symbols) if code not in supported]
+
+    @staticmethod
+    def load(base_currency, symbols, start_date, end_date):
+        """Load time series data from database, falling back to Frankfurter API.
+        
+        Takes date objects, with end_date None for the latest date. Returns (data, source).
+        """
+        # Try database first
+        target_currencies = list(parse_symbols(symbols))
+        symbols = ','.join(target_currencies)
+        
+        try:
+            # Try to get data from database
+            db_data, missing_ranges = DatabaseManager.get_time_series_data(
+                base_currency, target_currencies, start_date, end_date,
+                no_data_days=TimeSeriesService.get_no_data_days(base_currency)
+            )
+            
+            if db_data and db_data['rates']:
+                if not missing_ranges:
+                    return db_data, 'database'
+                # Database partially covers the request, only fetch what's missing
+                return TimeSeriesService._fetch_and_merge_partial_data(db_data, missing_ranges, base_currency, symbols), 'database+frankfurter_api'
+        except requests.exceptions.RequestException:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get time series from database: {str(e)}")
+        
+        # Database doesn't have any data, call API for the whole range
+        api_data = TimeSeriesService._fetch_api_data(base_currency, symbols, start_date, end_date)
+
+        # Save to database
+        TimeSeriesService._save_rates(api_data['base'], api_data['rates'])
+
+        return api_data, 'frankfurter_api'
+
+    @staticmethod
+    def _fetch_and_merge_partial_data(db_data, missing_ranges, base_currency, symbols):
+        """Fetch the missing ranges from Frankfurter and merge them into db_data.
+        
+        Gaps are coalesced across all target currencies first, so each distinct range
+        is one request with every currency that needs it in `symbols`. The requests
+        are I/O bound, so they are issued concurrently; saving and merging stay on
+        the calling thread.
+        """
+        merged_ranges = TimeSeriesService._merge_overlapping_ranges(
+            [missing_range for ranges in missing_ranges.values() for missing_range in ranges]
+        )
+        fetches = []
+        for range_start, range_end in merged_ranges:
+            # None means no symbols were requested, so fetch all targets
+            currencies = sorted(
+                target_currency or ''
+                for target_currency, ranges in missing_ranges.items()
+                if any(start <= range_end and end >= range_start for start, end in ranges)
+            )
+            fetches.append((currencies, range_start, range_end))
+        
+        api_responses = list(get_fetch_executor().map(
+            # Gap fills go straight into the database, so their bodies aren't kept for revalidation
+            lambda fetch: TimeSeriesService._fetch_api_data(base_currency, ','.join(fetch[0]), fetch[1], fetch[2], revalidate=False),
+            fetches
+        ))
+        
+        # Each response only holds the symbols requested for its range, so dates
+        # merge straight in with setdefault/update, one O(1) step per date
+        rates = db_data['rates']
+        fetched_rates = {}
+        window_start, window_end = db_data['start_date'], db_data['end_date']
+        for api_data in api_responses:
+            for date_str, rates_on_date in api_data['rates'].items():
+                fetched_rates.setdefault(date_str, {}).update(rates_on_date)
+                # Frankfurter may return the business day before range_start
+                if window_start <= date_str <= window_end:
+                    rates.setdefault(date_str, {}).update(rates_on_date)
+        
+        TimeSeriesService._record_no_data_days(base_currency, fetches, api_responses)
+        
+        # One bulk upsert for everything fetched, rather than one per response. Responses
+        # can overlap rows already stored (the business day before a range, or targets
+        # that only missed part of it), so those are skipped.
+        TimeSeriesService._save_rates(base_currency, fetched_rates, skip_existing=True)
+        
+        db_data['rates'] = dict(sorted(rates.items()))
+        return db_data
+
+    @staticmethod
+    def get_no_data_days(base_currency):
+        """Return {target_currency: days} Frankfurter has answered without rates for a base.
+        
+        These are weekdays with no publication (ECB holidays), or days a target wasn't
+        quoted on. The None target holds days without rates for any target.
+        """
+        cached = CacheManager.get_cached_data(TimeSeriesService._no_data_days_cache_key(base_currency), NO_DATA_DAYS_TIMEOUT)
+        if not cached:
+            return {}
+        return {
+            target_currency or None: frozenset(date.fromisoformat(day) for day in days)
+            for target_currency, days in cached.items()
+        }
+
+    @staticmethod
+    def _record_no_data_days(base_currency, fetches, api_responses):
+        """Remember the weekdays of fetched ranges that came back without rates.
+        
+        Without this, a holiday inside the database's coverage looks like a gap on
+        every load and is fetched again forever. Today and later are never recorded,
+        since their rates may simply not be published yet.
+        """
+        one_day = timedelta(days=1)
+        today = date.today()
+        new_days = {}
+        for (currencies, range_start, range_end), api_data in zip(fetches, api_responses):
+            rates = api_data['rates']
+            day = range_start
+            while day <= range_end and day < today:
+                if day.weekday() < 5:
+                    rates_on_date = rates.get(day.isoformat(), {})
+                    for target_currency in currencies:
+                        # '' means the range was fetched for all targets
+                        has_rates = bool(rates_on_date) if target_currency == '' else target_currency in rates_on_date
+                        if not has_rates:
+                            new_days.setdefault(target_currency, set()).add(day)
+                day += one_day
+        if not new_days:
+            return
+        
+        # Merge into the latest stored copy, re-read so concurrent recordings are kept
+        stored = {
+            target_currency or '': set(days)
+            for target_currency, days in TimeSeriesService.get_no_data_days(base_currency).items()
+        }
+        changed = False
+        for target_currency, days in new_days.items():
+            known = stored.setdefault(target_currency, set())
+            if not days <= known:
+                known |= days
+                changed = True
+        if changed:
+            CacheManager.set_cached_data(
+                TimeSeriesService._no_data_days_cache_key(base_currency),
+                {target_currency: sorted(day.isoformat() for day in days) for target_currency, days in stored.items()},
+                NO_DATA_DAYS_TIMEOUT
+            )
+
+    @staticmethod
+    def _no_data_days_cache_key(base_currency):
+        return f"no_data_days:{base_currency}"
+
+    @staticmethod
+    def _merge_overlapping_ranges(ranges):
+        """Merge overlapping or adjacent (start, end) date ranges into a sorted disjoint list.
+        
+        The scan runs on day ordinals so each step is a plain int compare.
+        """
+        if not ranges:
+            return []
+        ordinals = sorted((start.toordinal(), end.toordinal()) for start, end in ranges)
+        merged = []
+        current_start, current_end = ordinals[0]
+        for start, end in ordinals[1:]:
+            if start <= current_end + 1:
+                if end > current_end:
+                    current_end = end
+            else:
+                merged.append((current_start, current_end))
+                current_start, current_end = start, end
+        merged.append((current_start, current_end))
+        return [(date.fromordinal(start), date.fromordinal(end)) for start, end in merged]
+
+    @staticmethod
+    def _fetch_api_data(base_currency, symbols, start_date, end_date, revalidate=True):
+        """Call Frankfurter API for a time series range, end_date None meaning the latest date."""
+        url, params = build_frankfurter_request(base_currency, symbols, start_date, end_date)
+        
+        # call Frankfurter API
+        return fetch_json(url, params=dict(params), timeout=15, revalidate=revalidate)
+
+    @staticmethod
+    def _save_rates(base_currency, rates_by_date, skip_existing=False):
+        """Persist a {date: {target_currency: rate}} mapping with one bulk upsert."""
+        try:
+            DatabaseManager.bulk_save_exchange_rates(base_currency, rates_by_date, skip_existing=skip_existing)
+        except Exception as e:
+            logger.error(f"Failed to batch save time series data: {str(e)}")
+
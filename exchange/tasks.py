@@ -1,11 +1,21 @@
 from celery import shared_task
-from datetime import datetime, timedelta
-import requests
+from django.conf import settings
+from django.db import transaction
+from datetime import date, datetime, timedelta
+import ijson
 import logging
 from .db_utils import DatabaseManager
+from .http_utils import http_session
+from .services import TimeSeriesService
 
 logger = logging.getLogger(__name__)
 
+# Number of rates buffered from the streamed response before each bulk save
+SAVE_BATCH_SIZE = 1000
+
+# Seconds a web request may spend connecting to the broker to enqueue a refresh
+ENQUEUE_CONNECT_TIMEOUT = 1
+
 
 @shared_task
 def fetch_last_month_data():
@@ -27,7 +37,7 @@ def fetch_last_month_data():
         
         # Fetch currencies
         currencies_url = "https://api.frankfurter.dev/v1/currencies"
-        currencies_response = requests.get(currencies_url, timeout=10)
+        currencies_response = http_session.get(currencies_url, timeout=10)
         currencies_response.raise_for_status()
         currencies_data = currencies_response.json()
         DatabaseManager.save_currencies(currencies_data)
@@ -39,23 +49,26 @@ def fetch_last_month_data():
         params = {'base': base_currency}
         
         logger.info(f"Fetching exchange rates for base currency: {base_currency}")
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        
-        api_data = response.json()
-        
-        # Save exchange rates to database
         saved_count = 0
-        for date_str, rates_on_date in api_data['rates'].items():
-            for target_currency, rate in rates_on_date.items():
-                result = DatabaseManager.save_exchange_rate(
-                    base_currency,
-                    target_currency,
-                    rate,
-                    date_str
-                )
-                if result:
-                    saved_count += 1
+        with http_session.get(url, params=params, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            # Let urllib3 undo any gzip encoding while ijson reads the raw stream
+            response.raw.decode_content = True
+            
+            # Parse dates out of the body as it arrives and save them in batches,
+            # committing the whole month at once; a failed batch rolls back them all
+            with transaction.atomic():
+                batch = {}
+                batch_rates = 0
+                for date_str, rates_on_date in ijson.kvitems(response.raw, 'rates'):
+                    batch[date_str] = rates_on_date
+                    batch_rates += len(rates_on_date)
+                    if batch_rates >= SAVE_BATCH_SIZE:
+                        saved_count += DatabaseManager.bulk_save_exchange_rates(base_currency, batch, raise_errors=True)
+                        batch = {}
+                        batch_rates = 0
+                if batch:
+                    saved_count += DatabaseManager.bulk_save_exchange_rates(base_currency, batch, raise_errors=True)
         
         logger.info(f"Successfully saved {saved_count} exchange rate records")
         return {'success': True, 'records_saved': saved_count}
@@ -64,3 +77,55 @@ def fetch_last_month_data():
         logger.error(f"Error in fetch_last_month_data: {str(e)}")
         raise
 
+
+# Nothing reads the result, and skipping it keeps the enqueue off the result backend
+@shared_task(ignore_result=True)
+def refresh_time_series(base_currency, symbols, start_date, end_date):
+    """
+    Reload one time series request from database/Frankfurter and store it into cache.
+    Enqueued by TimeSeriesView when it serves a stale cache entry.
+    """
+    try:
+        data = TimeSeriesService.refresh_cache(base_currency, symbols, start_date, end_date)
+        return {'success': True, 'dates': len(data['rates'])}
+    except Exception as e:
+        logger.error(f"Error in refresh_time_series: {str(e)}")
+        raise
+
+
+def enqueue_time_series_refresh(base_currency, symbols, start_date, end_date):
+    """
+    Enqueue refresh_time_series from a web request without waiting on the broker.
+    Publishing isn't retried and the connection gives up after one short attempt,
+    so a slow or unreachable broker raises quickly instead of stalling the request.
+    """
+    app = refresh_time_series.app
+    with app.connection_for_write(
+        connect_timeout=ENQUEUE_CONNECT_TIMEOUT,
+        transport_options={'max_retries': 0},
+    ) as connection:
+        refresh_time_series.apply_async(
+            args=(base_currency, symbols, start_date, end_date),
+            connection=connection,
+            retry=False,
+        )
+
+
+@shared_task
+def warm_time_series():
+    """
+    Refresh the cache of the popular time series requests in TIME_SERIES_WARM_LIST
+    for the last TIME_SERIES_WARM_DAYS days, so dashboard loads rarely miss.
+    Scheduled to run every 15 minutes.
+    """
+    start_date = (date.today() - timedelta(days=settings.TIME_SERIES_WARM_DAYS)).isoformat()
+    warmed = 0
+    for base_currency, symbols in settings.TIME_SERIES_WARM_LIST:
+        try:
+            TimeSeriesService.refresh_cache(base_currency, symbols, start_date, '')
+            warmed += 1
+        except Exception as e:
+            logger.error(f"Failed to warm time series {base_currency}/{symbols or '*'}: {str(e)}")
+    
+    logger.info(f"Warmed {warmed} time series cache entries")
+    return {'success': True, 'warmed': warmed}
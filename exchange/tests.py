@@ -1,3 +1,51 @@
-from django.test import TestCase
-
-# Create your tests here.
+from datetime import date, timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from .db_utils import DatabaseManager
+from .models import ExchangeRate
+from .services import TimeSeriesService
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PartialCacheHolidayTests(TestCase):
+    """A holiday inside stored coverage must only be fetched from Frankfurter once."""
+
+    def setUp(self):
+        cache.clear()
+        # Every business day from 2023-12-27 to 2024-01-12 except New Year's Day
+        day = date(2023, 12, 27)
+        rates = []
+        while day <= date(2024, 1, 12):
+            if day.weekday() < 5 and day != date(2024, 1, 1):
+                rates.append(ExchangeRate(base_currency='CAD', target_currency='USD', rate=0.75, date=day))
+            day += timedelta(days=1)
+        ExchangeRate.objects.bulk_create(rates)
+
+    def fake_fetch(self, base_currency, symbols, start_date, end_date, revalidate=True):
+        # Frankfurter answers a range with no rates with the business day before it
+        return {
+            'base': base_currency,
+            'start_date': '2023-12-29',
+            'end_date': '2023-12-29',
+            'rates': {'2023-12-29': {'USD': 0.75}},
+        }
+
+    def test_holiday_gap_served_from_database_after_first_fetch(self):
+        with mock.patch.object(TimeSeriesService, '_fetch_api_data', side_effect=self.fake_fetch) as fetch:
+            sources = [
+                TimeSeriesService.load('CAD', 'USD', date(2023, 12, 27), date(2024, 1, 12))[1]
+                for _ in range(3)
+            ]
+        
+        self.assertEqual(sources, ['database+frankfurter_api', 'database', 'database'])
+        fetch.assert_called_once_with('CAD', 'USD', date(2023, 12, 30), date(2024, 1, 1), revalidate=False)
+
+    def test_known_empty_days_only_cover_their_target(self):
+        no_data_days = {'USD': frozenset([date(2024, 1, 1)])}
+        _, missing_ranges = DatabaseManager.get_time_series_data(
+            'CAD', ['USD', 'EUR'], date(2023, 12, 27), date(2024, 1, 12), no_data_days=no_data_days
+        )
+        
+        self.assertNotIn('USD', missing_ranges)
+        self.assertEqual(missing_ranges['EUR'], [(date(2023, 12, 27), date(2024, 1, 12))])
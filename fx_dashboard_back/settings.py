@@ -23,6 +23,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.gzip.GZipMiddleware',  # compress JSON responses
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware 
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -62,6 +63,13 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'fxpass123'),
         'HOST': os.environ.get('POSTGRES_HOST', '127.0.0.1'),
         'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Keep connections open across requests instead of reconnecting every time
+        'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'sslmode': os.environ.get('POSTGRES_SSLMODE', 'prefer'),
+            'application_name': 'fx_dashboard',
+        },
     }
 }
 
@@ -90,6 +98,7 @@ CACHES = {
         'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'PICKLE_VERSION': 5,
             'SOCKET_CONNECT_TIMEOUT': 5,
             'SOCKET_TIMEOUT': 5,
             'CONNECTION_POOL_KWARGS': {
@@ -106,6 +115,7 @@ CACHES = {
 CACHE_TIMEOUT = {
     'currencies': 86400,      # 24 hours
     'time_series': 1800,     # 30 minutes
+    'upstream': 1800,        # 30 minutes, Frankfurter bodies kept for conditional revalidation
 }
 
 # Celery Configuration
@@ -116,10 +126,24 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
-# Celery Beat Schedule - Run on 1st of every month at 2 AM UTC
+# Celery Beat Schedule - Run on 1st of every month at 2 AM UTC,
+# and keep popular time series warm in cache every 15 minutes
 CELERY_BEAT_SCHEDULE = {
     'fetch-last-month-data': {
         'task': 'exchange.tasks.fetch_last_month_data',
         'schedule': crontab(day_of_month=1, hour=2, minute=0),
     },
-}
\ No newline at end of file
+    'warm-time-series': {
+        'task': 'exchange.tasks.warm_time_series',
+        'schedule': crontab(minute='*/15'),
+    },
+}
+
+# (base, symbols) pairs warmed by warm-time-series for the last TIME_SERIES_WARM_DAYS days,
+# they must match the query params sent by the frontend to produce the same cache key
+TIME_SERIES_WARM_LIST = [
+    ('CAD', ''),
+    ('USD', ''),
+    ('EUR', ''),
+]
+TIME_SERIES_WARM_DAYS = 30
\ No newline at end of file